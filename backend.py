@@ -1,61 +1,86 @@
 import pandas as pd
 import numpy as np
-from census_vars import census_vars
+from census_vars import UNIQUE_CENSUS_LABELS
 import json
+from functools import lru_cache
 
-df = pd.read_csv('county_data.csv', dtype={'FIPS': str, 'YEAR': str})
+# Only read the columns the app uses: the pyarrow reader then skips decoding
+# anything else in the file. State and county names are stored as categories.
+app_columns = ['STATE_NAME', 'COUNTY_NAME', 'YEAR', 'STATE_FIPS', 'COUNTY_FIPS', *UNIQUE_CENSUS_LABELS]
+df = pd.read_parquet('county_data.parquet', columns=app_columns).astype({'YEAR': str})
 with open("county_map.json", "r") as read_file:
     county_map = json.load(read_file)
 
+# Most lookups are for a single (state, county) pair. Indexing the data on those
+# two columns once, here, lets each lookup avoid scanning the whole dataframe.
+df_by_county = df.set_index(['STATE_NAME', 'COUNTY_NAME']).sort_index()
+
+# The county dropdown only depends on the state, so build every state's
+# (alphabetically sorted) list of counties once
+county_names_by_state = (
+    df_by_county
+    .index
+    .unique()
+    .to_frame(index=False)
+    .groupby('STATE_NAME', observed=True)
+    ['COUNTY_NAME']
+    .agg(tuple)
+    .to_dict()
+)
+
+# Streamlit reruns the whole script on every interaction, so the functions that
+# populate the dropdowns are cached. They return tuples so that callers cannot
+# modify the cached values.
+@lru_cache(maxsize=None)
 def get_state_names():
-    return df['STATE_NAME'].unique()
+    return tuple(df['STATE_NAME'].cat.categories)
 
 def get_county_names(state_name):
-    return (
-        df
-        .loc[df['STATE_NAME'] == state_name]
-        ['COUNTY_NAME']
-        .sort_values()
-        .unique()
-    )
+    return county_names_by_state[state_name]
 
 def get_census_data(state_name, county_name, var):
     return (
-        df
-        .loc[(df['STATE_NAME'] == state_name) & (df['COUNTY_NAME'] == county_name)]
-        [['STATE_NAME', 'COUNTY_NAME', 'YEAR', var]]
+        df_by_county
+        .loc[(state_name, county_name), ['YEAR', var]]
+        .reset_index()
     )
 
-# This code is hard to read but it serves a purpose.
-# In short: the order in which census_vars lists the variables is the order
-# in which I want them to appear in the dropdown. The issue is that they contain
-# duplicates due to the variable for "Work From Home" changing name throughtout
-# the years. This code removes the duplicates while retaining the initial ordering,
-# and prevents me from needing to duplicate data here. 
-# See: https://stackoverflow.com/a/17016257/2518602
 def get_unique_census_labels():
-    return list(dict.fromkeys(census_vars.values()))
-
-def get_ranking_df(column):
-    df2 = df.copy() # We don't want to modify the global variable
-
-    # Select just the rows and columns we need
-    df2 = df2.loc[(df2['YEAR'] == '2019') | (df2['YEAR'] == '2021')]
-    df2 = df2[['STATE_NAME', 'COUNTY_NAME', 'YEAR', column]]
-
-    # Combine state and county into a single column
-    df2 = df2.assign(County=lambda x: x.COUNTY_NAME + ', ' + x.STATE_NAME)
-    df2 = df2.drop(columns=['STATE_NAME', 'COUNTY_NAME'])
+    return UNIQUE_CENSUS_LABELS
+
+# Both the "Rankings" and "Map" tabs show how each county changed between 2019 and 2021.
+# This builds that table once, indexed by (County, FIPS) and sorted by percent change.
+def get_change_df(column):
+    # Select just the rows and columns we need. This returns a new dataframe,
+    # so the global variable is never modified.
+    df2 = df.loc[
+        df['YEAR'].isin(('2019', '2021')),
+        ['STATE_FIPS', 'COUNTY_FIPS', 'STATE_NAME', 'COUNTY_NAME', 'YEAR', column]
+    ]
+
+    # Combine state and county into a single column, and build the 5 character FIPS 
+    # code (e.g. "01003") that the map uses to identify counties
+    df2 = df2.assign(
+        County=lambda x: x.COUNTY_NAME.astype(str) + ', ' + x.STATE_NAME.astype(str),
+        FIPS=lambda x: (x.STATE_FIPS.astype(np.int64) * 1000 + x.COUNTY_FIPS).astype(str).str.zfill(5)
+    )
+    df2 = df2.drop(columns=['STATE_FIPS', 'COUNTY_FIPS', 'STATE_NAME', 'COUNTY_NAME'])
 
-    # Pivot for structure we need, calculate change and percent change, sort
-    df2 = df2.pivot_table(index='County', columns='YEAR', values=column)
+    # Pivot for structure we need, calculate change and percent change, sort.
+    # Each (County, FIPS, YEAR) triple is unique, so there is nothing to aggregate.
+    df2 = df2.set_index(['County', 'FIPS', 'YEAR'])[column].unstack('YEAR')
     df2['Change'] = df2['2021'] - df2['2019']
     df2['Percent Change'] = (df2['2021'] - df2['2019']) / df2['2019'] * 100
     df2['Percent Change'] = df2['Percent Change'].round(1)
     df2 = df2.sort_values('Percent Change', ascending=False)
 
+    return df2
+
+def get_ranking_df(column):
+    df2 = get_change_df(column).reset_index('FIPS', drop=True)
+
     # Create an index called "Rank" and drop columns with NA
-    df2['Rank'] = list(range(1, len(df2.index) + 1))
+    df2['Rank'] = np.arange(1, len(df2.index) + 1, dtype=np.int64)
     df2 = df2.reset_index().set_index('Rank')
     df2 = df2.dropna()
 
@@ -64,40 +89,21 @@ def get_ranking_df(column):
 def get_ranking_text(state, county, var, ranking_df):
     full_name = ', '.join([county, state])
 
-    if full_name not in list(ranking_df['County']):
+    # A single comparison over the column both checks for the county and finds its rank
+    ranks = ranking_df.index[ranking_df['County'] == full_name]
+
+    if len(ranks) == 0:
         return f"**{full_name}** does not have a ranking for **{var}**."
     
-    rank = (
-        ranking_df
-        [ranking_df['County'] == full_name]
-        .index
-        .tolist()[0]
-    )
+    rank = ranks[0]
 
     num_counties = len(ranking_df.index)
 
     return f"{full_name} ranks **{rank}** of {num_counties}."
 
 def get_mapping_df(column):
-    df2 = df.copy() # We don't want to modify the global variable
-
-    # Select just the rows and columns we need
-    df2 = df2.loc[(df2['YEAR'] == '2019') | (df2['YEAR'] == '2021')]
-    df2 = df2[['FIPS', 'STATE_NAME', 'COUNTY_NAME', 'YEAR', column]]
-
-    # Combine state and county into a single column
-    df2 = df2.assign(County=lambda x: x.COUNTY_NAME + ', ' + x.STATE_NAME)
-    df2 = df2.drop(columns=['STATE_NAME', 'COUNTY_NAME'])
-
-    # Pivot for structure we need, calculate change and percent change, sort
-    df2 = df2.pivot_table(index=['FIPS', 'County'], columns='YEAR', values=column)
-    df2['Change'] = df2['2021'] - df2['2019']
-    df2['Percent Change'] = (df2['2021'] - df2['2019']) / df2['2019'] * 100
-    df2['Percent Change'] = df2['Percent Change'].round(1)
-    df2 = df2.sort_values('Percent Change', ascending=False)
-
     df2 = (
-        df2
+        get_change_df(column)
         .replace([np.inf, -np.inf], np.nan)
         .dropna()
         .reset_index()
@@ -108,4 +114,4 @@ def get_mapping_df(column):
     # show in the "Rankings" tab.
     df2['Quartile'] = pd.qcut(df2['Percent Change'], q=4)
 
-    return df2
\ No newline at end of file
+    return df2
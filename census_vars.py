@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 # The Census Bureau calls 'B01001_001E' a 'Name' and 'Total Population' a 'Label'.
 # The actual labels from Census are a bit awkward (e.g. "Estimate!!Total!!Worked at home"),
 # so replace them with something simpler.
@@ -11,8 +13,20 @@ census_vars = {
     'B25058_001E' : 'Median Rent'
 }
 
+# This code is hard to read but it serves a purpose.
+# In short: the order in which census_vars lists the variables is the order
+# in which I want them to appear in the dropdown. The issue is that they contain
+# duplicates due to the variable for "Work From Home" changing name throughtout
+# the years. This code removes the duplicates while retaining the initial ordering,
+# and prevents me from needing to duplicate data here. 
+# census_vars never changes, so this is only computed once.
+# See: https://stackoverflow.com/a/17016257/2518602
+UNIQUE_CENSUS_LABELS = tuple(dict.fromkeys(census_vars.values()))
+
 # In 2005 B08006_017E was used for "total motorcycle commuters". 
 # In all other years it was used for "total worked from home".
+# The result is cached per year, so callers should not modify it.
+@lru_cache(maxsize=None)
 def get_census_vars_for_year(year):
     ret = dict(census_vars) # Copy to avoid modifying the global variable
     if year == 2005:
@@ -3,12 +3,15 @@
 # (STATE_NAME, COUNTY_NAME, YEAR, 'Total Population', 'Worked From Home', ...)
 #
 # The Census API only lets you get data from one year at a time. So the core of 
-# this script is a for loop like:
+# this script is a loop like:
 #
-# df = None
+# frames = []
 # for year in years:
 #   Get data for this year
-#   Append it to df
+#   Append it to frames
+# df = concat(frames)
+#
+# The years are independent of each other, so they are downloaded in parallel.
 #
 # But there are issues with the raw data that we want to address:
 # 
@@ -32,8 +35,8 @@
 # period that we're interested in
 import pandas as pd
 import time
-from census_vars import census_vars, get_census_vars_for_year
-from backend import get_unique_census_labels
+from concurrent.futures import ThreadPoolExecutor
+from census_vars import census_vars, get_census_vars_for_year, UNIQUE_CENSUS_LABELS
 import censusdis.data as ced
 from censusdis.datasets import ACS1
 from censusdis.states import ALL_STATES_AND_DC
@@ -42,7 +45,6 @@ from validate_variable_labels import print_labels_for_variables_over_time
 print("Generating data. Please wait.")
 
 start_time = time.time()
-df_county_data = None
 
 # We want all years the ACS1 was published. Note that it was not published in 2020 due to covid.
 # See https://www.census.gov/programs-surveys/acs/data/experimental-data.html
@@ -53,13 +55,13 @@ years = [year
          for year in range(ACS1_START_YEAR, ACS1_END_YEAR + 1) 
          if year not in ACS1_SKIP_YEARS]
 
-for one_year in years: 
-    # Provide some feedback on progress to the user
-    print('.', end='', flush=True) 
+# Downloads are network-bound, so running several at once mostly means waiting
+# on the Census API in parallel
+MAX_DOWNLOAD_WORKERS = 8
 
+def get_county_data_for_year(one_year):
     # Get all the variables we want to view in the app, plus the name of the county
-    vars = list(get_census_vars_for_year(one_year).keys())
-    vars.append('NAME')
+    vars = [*get_census_vars_for_year(one_year).keys(), 'NAME']
 
     df_new = ced.download(
         dataset = ACS1,
@@ -69,39 +71,46 @@ for one_year in years:
         county = '*')
     
     # Add in some new columns to make working with the data a bit easier
-    df_new['COUNTY_NAME'] = df_new['NAME'].apply(lambda name: name.split(', ')[0])
-    df_new['STATE_NAME']  = df_new['NAME'].apply(lambda name: name.split(', ')[1])
+    # NAME looks like "Baldwin County, Alabama"
+    df_new[['COUNTY_NAME', 'STATE_NAME']] = df_new['NAME'].str.split(', ', n=1, expand=True)
 
     df_new = df_new.set_index(['STATE', 'COUNTY'])
     df_new['YEAR'] = one_year
 
-    if df_county_data is None:
-        df_county_data = df_new
-    else:
-        df_county_data = pd.concat([df_county_data, df_new])
+    # Provide some feedback on progress to the user
+    print('.', end='', flush=True) 
+
+    return df_new
+
+# map() returns the results in the same order as years
+with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+    frames = list(executor.map(get_county_data_for_year, years))
+
+# Concatenate once at the end. Concatenating inside the loop would copy all
+# previous years' data on every iteration.
+df_county_data = pd.concat(frames)
 
 print(f"\nGenerating all historic data took {(time.time() - start_time):.1f} seconds.")
 print(f"The resulting dataframe has {len(df_county_data.index):,} rows with {len(df_county_data.index.unique()):,} unique counties.")
 
 # Step 2: Get a list of all counties that appear in both 2019 and 2021
-df_counties_2019 = ced.download(
-    dataset=ACS1,
-    vintage=2019,
-    download_variables='NAME',
-    state=ALL_STATES_AND_DC,
-    county='*'
-)
-
-df_counties_2021 = ced.download(
-    dataset=ACS1,
-    vintage=2021,
-    download_variables='NAME',
-    state=ALL_STATES_AND_DC,
-    county='*'
-)
-
-names_of_counties_2019 = set(df_counties_2019['NAME'])
-names_of_counties_2021 = set(df_counties_2021['NAME'])
+def get_county_names_for_year(one_year):
+    return ced.download(
+        dataset=ACS1,
+        vintage=one_year,
+        download_variables='NAME',
+        state=ALL_STATES_AND_DC,
+        county='*'
+    )
+
+with ThreadPoolExecutor(max_workers=2) as executor:
+    future_2019 = executor.submit(get_county_names_for_year, 2019)
+    future_2021 = executor.submit(get_county_names_for_year, 2021)
+    df_counties_2019 = future_2019.result()
+    df_counties_2021 = future_2021.result()
+
+names_of_counties_2019 = pd.Index(df_counties_2019['NAME'])
+names_of_counties_2021 = pd.Index(df_counties_2021['NAME'])
 names_of_counties_in_both = names_of_counties_2019.intersection(names_of_counties_2021)
 print(f"{len(names_of_counties_in_both):,} counties appear in both 2019 and 2021.")
 
@@ -118,18 +127,12 @@ print("Check to make sure no single varible is not used for completely different
 print_labels_for_variables_over_time(df_county_data)
 
 # Merge the two columns that have work from home data.
-def splice_wfh_columns(row):
-    # Error check: ensure that, for each row, at *most* one of them has data
-    # (For small regions, both values will be NA)
-    assert pd.isna(row['B08006_021E']) or pd.isna(row['B08006_017E']) 
-
-    # If the first is not NA, then return it
-    if not pd.isna(row['B08006_021E']):
-        return row['B08006_021E']
-    else:
-        return row['B08006_017E']
-
-df_county_data['Total Worked from Home'] = df_county_data.apply(splice_wfh_columns, axis=1)
+# Error check: ensure that, for each row, at *most* one of them has data
+# (For small regions, both values will be NA)
+assert not (df_county_data['B08006_021E'].notna() & df_county_data['B08006_017E'].notna()).any()
+
+# Given the above, taking the first column and filling its gaps from the second merges them
+df_county_data['Total Worked from Home'] = df_county_data['B08006_021E'].fillna(df_county_data['B08006_017E'])
 del df_county_data['B08006_021E']
 del df_county_data['B08006_017E']
 
@@ -138,16 +141,25 @@ df_county_data = df_county_data.rename(columns = census_vars)
 
 # Reorder columns
 column_order = ['STATE_NAME', 'COUNTY_NAME', 'YEAR']
-column_order.extend(get_unique_census_labels()) # Columns appear in same order as UI dropdown
+column_order.extend(UNIQUE_CENSUS_LABELS) # Columns appear in same order as UI dropdown
 df_county_data = df_county_data[column_order]
 
 # Remove the index and drop those columns. 
-# Retain FIPS code as a single column for mapping.
+# Retain the FIPS codes for mapping. They are stored as small integers (state
+# codes fit in 1 byte, county codes in 2) and the 5 character FIPS code that 
+# the map needs is built from them when needed.
 df_county_data = (
     df_county_data
     .reset_index()
-    .assign(FIPS = lambda x: x.STATE + x.COUNTY)
+    .assign(STATE_FIPS = lambda x: x.STATE.astype('uint8'),
+            COUNTY_FIPS = lambda x: x.COUNTY.astype('uint16'))
     .drop(columns=['STATE', 'COUNTY'])
 )
 
-df_county_data.to_csv('county_data.csv', index=False)
\ No newline at end of file
+# Parquet loads much faster than CSV and keeps the column types. Storing the state
+# and county names as categories lets them be dictionary-encoded in the file.
+(
+    df_county_data
+    .astype({'STATE_NAME': 'category', 'COUNTY_NAME': 'category'})
+    .to_parquet('county_data.parquet', index=False, compression='zstd')
+)
\ No newline at end of file